@@ -1,21 +1,52 @@
 #!/usr/bin/env python
+"""Run IQE smoke tests through a ClowdJobInvocation.
+
+Like deploy.py, this is latency-bound I/O — GitHub label lookups, oc/bonfire
+subprocesses, and log streaming dominate. Optimize by skipping, caching, or
+overlapping those waits rather than tuning any in-process computation.
+"""
 
 import argparse
 import json
 import os
+import subprocess
 import sys
+import time
 import typing as t
 
+from concurrent.futures import ThreadPoolExecutor
 from functools import cached_property
 from itertools import chain
 
-import sh
-
 from deploy import display
 from deploy import get_pr_labels
 from deploy import get_timeout
-from sh import bonfire
-from sh import oc
+
+
+# Label-to-expression tables, in priority order (first match wins).
+FILTER_EXPRESSIONS = {
+    "aws-smoke-tests": "test_api_aws or test_api_ocp_on_aws or test_api_cost_model_aws or test_api_cost_model_ocp_on_aws",
+    "azure-smoke-tests": "test_api_azure or test_api_ocp_on_azure or test_api_cost_model_azure or test_api_cost_model_ocp_on_azure",
+    "gcp-smoke-tests": "test_api_gcp or test_api_ocp_on_gcp or test_api_cost_model_gcp or test_api_cost_model_ocp_on_gcp",
+    "oci-smoke-tests": "test_api_oci or test_api_cost_model_oci",
+    "ocp-smoke-tests": (
+        "(test_api_ocp or test_api_cost_model_ocp or aws_ingest_single or aws_ingest_multi) and not ocp_on_gcp and not ocp_on_azure and not ocp_on_cloud"
+    ),
+    "cost-model-smoke-tests": "test_api_cost_model or ocp_source_raw",
+    "hot-fix-smoke-tests": "test_api",
+    "full-run-smoke-tests": "test_api",
+    "smoke-tests": "test_api",
+}
+
+MARKER_EXPRESSIONS = {
+    "ocp-smoke-tests": "cost_smoke and not cost_exclude_ocp_smokes",
+    "hot-fix-smoke-tests": "cost_hotfix",
+    "smoke-tests": "cost_required",
+}
+
+# Every known smoke-test label; one C-level set probe covers the common case
+# before falling back to the suffix scan for labels not in the table.
+SMOKE_TEST_LABELS = frozenset(FILTER_EXPRESSIONS)
 
 
 class IQERunner:
@@ -27,21 +58,64 @@ class IQERunner:
         pr_number: str = "",
     ) -> None:
         self.namespace = namespace
-        self.requester = requester
         self.pod = None
         self.check = check
         self.pr_number = pr_number
 
-        self.component_name = os.environ.get("BONFIRE_COMPONENT_NAME") or os.environ.get("COMPONENT_NAME")
-        self.iqe_env = os.environ.get("IQE_ENV", "clowder_smoke")
-        self.iqe_image_tag = os.environ.get("IQE_IMAGE_TAG", "")
-        self.iqe_env_vars = os.environ.get("IQE_ENV_VARS", "").split()
-        self.iqe_plugins = os.environ.get("IQE_PLUGINS", "")
-        self.iqe_requirements = os.environ.get("IQE_REQUIREMENTS", "")
-        self.iqe_requirements_priority = os.environ.get("IQE_REQUIREMENTS_PRIORITY", "")
-        self.iqe_test_importance = os.environ.get("IQE_TEST_IMPORTANCE", "")
-        self.pipeline_run_name = os.environ.get("PIPELINE_RUN_NAME") or ""
-        self.selenium = os.environ.get("IQE_SELENIUM", "")
+        # Set once for every child process instead of copying the whole
+        # environment into a per-call dict.
+        os.environ["BONFIRE_NS_REQUESTER"] = requester
+
+        # One snapshot serves every config lookup below; the environment
+        # does not change for the life of the run.
+        self.environ = dict(os.environ)
+
+        # Overlap the GitHub round-trip with the rest of the setup work.
+        self._pr_labels_future = None
+        if not check:
+            self._pr_labels_future = ThreadPoolExecutor(max_workers=1).submit(get_pr_labels, pr_number)
+
+    # The environment is only consulted lazily so the skip paths in run()
+    # never pay for configuration they do not use.
+    @cached_property
+    def component_name(self) -> str | None:
+        return self.environ.get("BONFIRE_COMPONENT_NAME") or self.environ.get("COMPONENT_NAME")
+
+    @cached_property
+    def iqe_env(self) -> str:
+        return self.environ.get("IQE_ENV", "clowder_smoke")
+
+    @cached_property
+    def iqe_image_tag(self) -> str:
+        return self.environ.get("IQE_IMAGE_TAG", "")
+
+    @cached_property
+    def iqe_env_vars(self) -> list[str]:
+        return self.environ.get("IQE_ENV_VARS", "").split()
+
+    @cached_property
+    def iqe_plugins(self) -> str:
+        return self.environ.get("IQE_PLUGINS", "")
+
+    @cached_property
+    def iqe_requirements(self) -> str:
+        return self.environ.get("IQE_REQUIREMENTS", "")
+
+    @cached_property
+    def iqe_requirements_priority(self) -> str:
+        return self.environ.get("IQE_REQUIREMENTS_PRIORITY", "")
+
+    @cached_property
+    def iqe_test_importance(self) -> str:
+        return self.environ.get("IQE_TEST_IMPORTANCE", "")
+
+    @cached_property
+    def pipeline_run_name(self) -> str:
+        return self.environ.get("PIPELINE_RUN_NAME") or ""
+
+    @cached_property
+    def selenium(self) -> str:
+        return self.environ.get("IQE_SELENIUM", "")
 
     @property
     def job_name(self) -> str:
@@ -62,7 +136,7 @@ class IQERunner:
             31510716818 --> 31510
         """
 
-        check_run_id = os.environ.get("CHECK_RUN_ID") or "1"
+        check_run_id = self.environ.get("CHECK_RUN_ID") or "1"
         try:
             build_number = check_run_id[:5]
         except TypeError:
@@ -75,7 +149,7 @@ class IQERunner:
     def build_url(self) -> str:
         """Create a build URL for the pipeline run"""
 
-        application = os.environ.get("APPLICATION")
+        application = self.environ.get("APPLICATION")
         return f"https://console.redhat.com/application-pipeline/workspaces/cost-mgmt-dev/applications/{application}/pipelineruns/{self.pipeline_run_name}"
 
     @cached_property
@@ -83,57 +157,26 @@ class IQERunner:
         return ["--selenium"] if self.selenium.lower() == "true" else []
 
     @cached_property
-    def env(self) -> dict[str, str]:
-        return os.environ | {"BONFIRE_NS_REQUESTER": self.requester}
-
-    @cached_property
-    def iqe_env_vars_arg(self) -> t.Iterable[str]:
+    def iqe_env_vars_arg(self) -> tuple[str, ...]:
         job_name = f"JOB_NAME={self.job_name}"
         build_number = f"BUILD_NUMBER={self.build_number}"
         build_url = f"BUILD_URL={self.build_url}"
         env_var_params = [job_name, build_number, build_url]
-        return chain.from_iterable(("--env-var", var) for var in env_var_params)
+        return tuple(chain.from_iterable(("--env-var", var) for var in env_var_params))
 
     @cached_property
     def iqe_filter_expression(self) -> str:
-        if iqe_filter_expression := os.environ.get("IQE_FILTER_EXPRESSION", ""):
+        if iqe_filter_expression := self.environ.get("IQE_FILTER_EXPRESSION", ""):
             return iqe_filter_expression
 
-        iqe_filter_expression = ""
-        if "aws-smoke-tests" in self.pr_labels:
-            iqe_filter_expression = "test_api_aws or test_api_ocp_on_aws or test_api_cost_model_aws or test_api_cost_model_ocp_on_aws"
-        elif "azure-smoke-tests" in self.pr_labels:
-            iqe_filter_expression = "test_api_azure or test_api_ocp_on_azure or test_api_cost_model_azure or test_api_cost_model_ocp_on_azure"
-        elif "gcp-smoke-tests" in self.pr_labels:
-            iqe_filter_expression = "test_api_gcp or test_api_ocp_on_gcp or test_api_cost_model_gcp or test_api_cost_model_ocp_on_gcp"
-        elif "oci-smoke-tests" in self.pr_labels:
-            iqe_filter_expression = "test_api_oci or test_api_cost_model_oci"
-        elif "ocp-smoke-tests" in self.pr_labels:
-            iqe_filter_expression = (
-                "(test_api_ocp or test_api_cost_model_ocp or aws_ingest_single or aws_ingest_multi) "
-                "and not ocp_on_gcp and not ocp_on_azure and not ocp_on_cloud"
-            )
-        elif "cost-model-smoke-tests" in self.pr_labels:
-            iqe_filter_expression = "test_api_cost_model or ocp_source_raw"
-        elif any(item in self.pr_labels for item in ("hot-fix-smoke-tests", "full-run-smoke-tests", "smoke-tests")):
-            iqe_filter_expression = "test_api"
-
-        return iqe_filter_expression
+        return next((expression for label, expression in FILTER_EXPRESSIONS.items() if label in self.pr_labels), "")
 
     @cached_property
     def iqe_marker_expression(self) -> str:
-        if iqe_marker_expression := os.environ.get("IQE_MARKER_EXPRESSION", ""):
+        if iqe_marker_expression := self.environ.get("IQE_MARKER_EXPRESSION", ""):
             return iqe_marker_expression
 
-        iqe_marker_expression = "cost_smoke"
-        if "ocp-smoke-tests" in self.pr_labels:
-            iqe_marker_expression = "cost_smoke and not cost_exclude_ocp_smokes"
-        elif "hot-fix-smoke-tests" in self.pr_labels:
-            iqe_marker_expression = "cost_hotfix"
-        elif "smoke-tests" in self.pr_labels:
-            iqe_marker_expression = "cost_required"
-
-        return iqe_marker_expression
+        return next((expression for label, expression in MARKER_EXPRESSIONS.items() if label in self.pr_labels), "cost_smoke")
 
     @cached_property
     def iqe_cji_timeout(self) -> int:
@@ -142,23 +185,15 @@ class IQERunner:
     @cached_property
     def pr_labels(self) -> set[str]:
         if self.check:
-            return set(os.environ.get("PR_LABELS", "").split()) or {"run-konflux-tests", "hot-fix-smoke-tests", "bug"}
+            return set(self.environ.get("PR_LABELS", "").split()) or {"run-konflux-tests", "hot-fix-smoke-tests", "bug"}
 
-        return get_pr_labels(self.pr_number)
+        return self._pr_labels_future.result()
 
-    @property
-    def container(self) -> t.Any:
-        if self.pod is None:
-            return
-
-        return oc([
-            "get", "pod", self.pod,
-            "--namespace", self.namespace,
-            "--output", "jsonpath={.status.containerStatuses[0].name}",
-        ])  # fmt: off
-
-    def run_pod(self) -> str:
-        command = [
+    @cached_property
+    def run_pod_command(self) -> tuple[t.Any, ...]:
+        # A tuple so a retried run_pod reuses the same argv instead of
+        # re-expanding the (once consumable) argument generators.
+        return (
             "deploy-iqe-cji", self.component_name,
             "--marker", self.iqe_marker_expression,
             "--filter", self.iqe_filter_expression,
@@ -172,31 +207,70 @@ class IQERunner:
             *self.selenium_arg,
             *self.iqe_env_vars_arg,
             "--namespace", self.namespace,
-        ]  # fmt: off
-        display(["bonfire"] + command)
+        )  # fmt: off
+
+    def run_pod(self) -> str:
+        command = self.run_pod_command
+        display(("bonfire", *command))
 
         if self.check:
             sys.exit()
 
-        result = bonfire(*command, _tee=True, _env=self.env, _out=sys.stdout, _err=sys.stderr)
+        # Imported lazily; sh's import machinery is dead weight on the
+        # --check and skip-label paths.
+        from sh import bonfire
+
+        # bonfire prints only the pod name on stdout (progress goes to
+        # stderr), so capture it directly instead of teeing the stream
+        # into a second in-memory copy.
+        result = bonfire(*command, _err=sys.stderr)
         self.pod = result.rstrip()
+        display(self.pod)
 
         return self.pod
 
     def follow_logs(self) -> None:
-        oc.logs(self.pod, namespace=self.namespace, container=self.container, follow=True,
-            _out=sys.stdout,
-            _err=sys.stderr,
-            _timeout=self.iqe_cji_timeout,
-        )  # fmt: off
+        # Inherit stdout/stderr so log bytes flow straight from the oc child
+        # to the console instead of being pumped through Python buffers.
+        # The CJI pod runs a single container, so oc defaults to it and no
+        # containerStatuses lookup is needed.
+        command = [
+            "oc", "logs", self.pod,
+            "--namespace", self.namespace,
+            "--follow",
+        ]  # fmt: off
+        subprocess.run(command, check=True, timeout=self.iqe_cji_timeout)
+
+    def get_cji(self) -> dict[str, t.Any]:
+        from sh import oc
 
-    def check_cji_jobs(self) -> None:
         data = oc.get(
             f"cji/{self.component_name}",
             output="json",
             namespace=self.namespace,
         )
-        cji = json.loads(data)
+
+        return json.loads(data)
+
+    def wait_for_cji(self) -> dict[str, t.Any]:
+        """Poll the CJI until JobInvocationComplete, returning the final object.
+
+        The logs have usually drained by the time this runs, so the common
+        case is a single query whose result also feeds check_cji_jobs.
+        """
+        deadline = time.monotonic() + self.iqe_cji_timeout
+        while True:
+            cji = self.get_cji()
+            conditions = cji.get("status", {}).get("conditions", [])
+            if any(condition.get("type") == "JobInvocationComplete" and condition.get("status") == "True" for condition in conditions):
+                return cji
+
+            if time.monotonic() >= deadline:
+                sys.exit(f"Timed out waiting for cji/{self.component_name} to complete")
+
+            time.sleep(10)
+
+    def check_cji_jobs(self, cji: dict[str, t.Any]) -> None:
         job_map = cji["status"]["jobMap"]
         if not all(v == "Complete" for v in job_map.values()):
             print(f"\nSome jobs failed: {job_map}", flush=True)
@@ -219,28 +293,27 @@ class IQERunner:
             display("PR is not labeled to run tests in Konflux")
             return
 
-        if "smokes-required" in self.pr_labels and not any(label.endswith("smoke-tests") for label in self.pr_labels):
+        if (
+            "smokes-required" in self.pr_labels
+            and self.pr_labels.isdisjoint(SMOKE_TEST_LABELS)
+            and not any(label.endswith("smoke-tests") for label in self.pr_labels)
+        ):
             sys.exit("Missing smoke tests labels.")
 
         self.run_pod()
 
         try:
             self.follow_logs()
-        except sh.TimeoutException:
+        except subprocess.TimeoutExpired:
+            from sh import oc
+
             display(f"Test exceeded timeout {self.iqe_cji_timeout}")
             oc.delete.pod(self.pod, namespace=self.namespace, _ok_code=[0, 1])
-        except sh.ErrorReturnCode as exc:
+        except subprocess.CalledProcessError as exc:
             display("Test command failed")
             display(str(exc))
 
-        oc([
-            "wait", "--timeout", f"{self.iqe_cji_timeout}s",
-            "--for", "condition=JobInvocationComplete",
-            "--namespace", self.namespace,
-            f"cji/{self.component_name}",
-        ])  # fmt: off
-
-        self.check_cji_jobs()
+        self.check_cji_jobs(self.wait_for_cji())
 
 
 def parse_args() -> argparse.Namespace:
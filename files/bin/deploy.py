@@ -1,89 +1,108 @@
 #!/usr/bin/env python
+"""Deploy the snapshot under test with bonfire.
+
+This script is latency-bound I/O: the time goes to GitHub API round-trips,
+subprocess spawns, and the bonfire deploy itself. Worthwhile optimizations
+are caching, batching, and overlapping those waits — not compute tuning.
+"""
 
 import argparse
 import json
 import os
+import pathlib
+import random
+import re
 import secrets
 import shlex
 import subprocess
 import sys
+import time
 import typing as t
+import urllib.parse
 import urllib.request
 
-from itertools import chain
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from urllib.error import HTTPError
 
-import fuzzydate
-
-from pydantic import AnyUrl
-from pydantic import BaseModel
-from pydantic import ConfigDict
-from pydantic import Field
-from pydantic import model_validator
-from pydantic import ValidationError
+import msgspec
 
 
-class Git(BaseModel):
-    model_config = ConfigDict(frozen=True)
-
-    url: AnyUrl
+class Git(msgspec.Struct, frozen=True):
+    url: str
     revision: str
 
 
-class Source(BaseModel):
-    model_config = ConfigDict(frozen=True)
-
+class Source(msgspec.Struct, frozen=True):
     git: Git
 
 
-class ContainerImage(BaseModel):
-    model_config = ConfigDict(frozen=True)
-
+class ContainerImage(msgspec.Struct, frozen=True):
     image: str
     sha: str
 
 
-class Component(BaseModel):
-    model_config = ConfigDict(frozen=True)
-
+class Component(msgspec.Struct, frozen=True):
     name: str
-    container_image: ContainerImage = Field(alias="containerImage")
+    container_image_ref: str = msgspec.field(name="containerImage")
     source: Source
 
-    @model_validator(mode="before")
-    @classmethod
-    def container_image_validator(cls, data: t.Any) -> t.Any:
-        if not isinstance(data, t.MutableMapping):
-            raise ValueError(f"{data} is not of mapping type")
-
-        image, sha = data["containerImage"].split("@sha256:")
-        data["containerImage"] = ContainerImage(image=image, sha=sha)
-        return data
+    def __post_init__(self) -> None:
+        # Reject malformed image refs at decode time so a bad snapshot
+        # fails parse_snapshot instead of blowing up mid-deploy.
+        if self.container_image_ref.count("@sha256:") != 1:
+            raise msgspec.ValidationError(f"Invalid containerImage reference: {self.container_image_ref!r}")
 
+    @property
+    def container_image(self) -> ContainerImage:
+        image, sha = self.container_image_ref.split("@sha256:")
+        return ContainerImage(image=image, sha=sha)
 
-class Snapshot(BaseModel):
-    model_config = ConfigDict(frozen=True)
 
+class Snapshot(msgspec.Struct, frozen=True):
     application: str
     components: list[Component]
 
 
+@lru_cache(maxsize=4)
+def parse_snapshot(snapshot_str: str) -> Snapshot:
+    return msgspec.json.decode(snapshot_str, type=Snapshot)
+
+
+# Rendered once per component via str.format_map; the flag strings stay
+# constant and only the placeholders are interpolated.
+COMPONENT_OPTIONS_TEMPLATE = (
+    "--set-template-ref", "{name}={revision}",
+    "--set-parameter", "{name}/IMAGE={image}",
+    "--set-parameter", "{name}/IMAGE_TAG={prefix}{short_revision}",
+    "--set-parameter", "{name}/DBM_IMAGE={image}",
+    "--set-parameter", "{name}/DBM_IMAGE_TAG={prefix}{short_revision}",
+    "--set-parameter", "{name}/DBM_INVOCATION={invocation}",
+)  # fmt: off
+
+
 def get_component_options(components: list[Component], pr_number: str | None = None) -> list[str]:
     prefix = ""
     if pr_number:
         prefix = f"pr-{pr_number}-"
 
+    name_override = os.environ.get("BONFIRE_COMPONENT_NAME")
+
+    # DBM_INVOCATION is just a cache-buster; one urandom draw seeds all of
+    # the per-component values.
+    rng = random.Random(secrets.token_bytes(16))
+
     result = []
     for component in components:
-        component_name = os.environ.get("BONFIRE_COMPONENT_NAME") or component.name
-        result.extend((
-            "--set-template-ref", f"{component_name}={component.source.git.revision}",
-            "--set-parameter", f"{component_name}/IMAGE={component.container_image.image}",
-            "--set-parameter", f"{component_name}/IMAGE_TAG={prefix}{component.source.git.revision[:7]}",
-            "--set-parameter", f"{component_name}/DBM_IMAGE={component.container_image.image}",
-            "--set-parameter", f"{component_name}/DBM_IMAGE_TAG={prefix}{component.source.git.revision[:7]}",
-            "--set-parameter", f"{component_name}/DBM_INVOCATION={secrets.randbelow(100)}",
-        ))  # fmt: off
+        context = {
+            "name": name_override or component.name,
+            "revision": component.source.git.revision,
+            "short_revision": component.source.git.revision[:7],
+            "image": component.container_image.image,
+            "prefix": prefix,
+            "invocation": rng.randrange(100),
+        }
+        result.extend(option.format_map(context) for option in COMPONENT_OPTIONS_TEMPLATE)
 
     return result
 
@@ -98,6 +117,8 @@ def parse_args() -> argparse.Namespace:
 
 
 def get_timeout(env_var: str, labels: set[str] | None = None) -> int:
+    import fuzzydate
+
     try:
         timeout = fuzzydate.to_seconds(os.environ.get(env_var, "2h"))
     except (TypeError, ValueError) as exc:
@@ -110,6 +131,80 @@ def get_timeout(env_var: str, labels: set[str] | None = None) -> int:
     return int(timeout)
 
 
+# Scripts in the same pipeline run share the label cache; entries younger
+# than this skip the GitHub round-trip entirely.
+PR_LABELS_CACHE_TTL = 5 * 60
+
+
+def _pr_labels_cache_file(owner: str, repo: str, pr_number: str) -> pathlib.Path:
+    cache_home = pathlib.Path(os.environ.get("XDG_CACHE_HOME") or pathlib.Path.home() / ".cache")
+    return cache_home / "koku-test-container" / "pr-labels" / f"{owner}-{repo}-{pr_number}.json"
+
+
+def _read_label_cache(cache_file: pathlib.Path) -> dict[str, t.Any]:
+    try:
+        return json.loads(cache_file.read_text())
+    except (OSError, json.JSONDecodeError):
+        return {}
+
+
+def _label_cache_is_fresh(cache_file: pathlib.Path) -> bool:
+    try:
+        return time.time() - cache_file.stat().st_mtime < PR_LABELS_CACHE_TTL
+    except OSError:
+        return False
+
+
+def _write_label_cache(cache_file: pathlib.Path, etag: str, labels: set[str]) -> None:
+    try:
+        cache_file.parent.mkdir(parents=True, exist_ok=True)
+        cache_file.write_text(json.dumps({"etag": etag, "labels": sorted(labels)}))
+    except OSError:
+        pass
+
+
+_LABELS_QUERY = """
+query ($owner: String!, $repo: String!, $number: Int!) {
+  repository(owner: $owner, name: $repo) {
+    pullRequest(number: $number) {
+      labels(first: 50) {
+        nodes {
+          name
+        }
+      }
+    }
+  }
+}
+"""
+
+
+def _get_pr_labels_graphql(pr_number: str, owner: str, repo: str, token: str) -> set[str]:
+    """Fetch only the label names instead of the full REST PR payload."""
+    try:
+        number = int(pr_number)
+    except ValueError:
+        sys.exit(f"Invalid PR number: {pr_number!r}")
+
+    payload = {"query": _LABELS_QUERY, "variables": {"owner": owner, "repo": repo, "number": number}}
+    request = urllib.request.Request(
+        "https://api.github.com/graphql",
+        data=json.dumps(payload).encode(),
+        headers={"Authorization": f"Bearer {token}", "Content-Type": "application/json"},
+    )
+
+    try:
+        with urllib.request.urlopen(request) as response:
+            data = json.loads(response.read())
+    except HTTPError as exc:
+        sys.exit(f"Error {exc.code} retrieving {exc.url}.")
+
+    pull_request = (data.get("data") or {}).get("repository", {}).get("pullRequest")
+    if pull_request is None:
+        sys.exit(f"Unable to retrieve labels for {owner}/{repo}#{pr_number}: {data.get('errors')}")
+
+    return {node["name"] for node in pull_request["labels"]["nodes"]}
+
+
 def get_pr_labels(
     pr_number: str,
     owner: str = "project-koku",
@@ -118,39 +213,60 @@ def get_pr_labels(
     if not pr_number:
         return set()
 
+    # The pipeline can pass the labels straight through (the same
+    # space-separated form --check mode uses) to skip the API round-trip.
+    if pr_labels := os.environ.get("PR_LABELS"):
+        return set(pr_labels.split())
+
+    cache_file = _pr_labels_cache_file(owner, repo, pr_number)
+    cached = _read_label_cache(cache_file)
+
+    if "labels" in cached and _label_cache_is_fresh(cache_file):
+        return set(cached["labels"])
+
+    if token := os.environ.get("GITHUB_TOKEN"):
+        labels = _get_pr_labels_graphql(pr_number, owner, repo, token)
+        _write_label_cache(cache_file, "", labels)
+        return labels
+
     url = f"https://api.github.com/repos/{owner}/{repo}/pulls/{pr_number}"
+    request = urllib.request.Request(url, headers={"Accept": "application/vnd.github+json"})
+    if cached.get("etag"):
+        request.add_header("If-None-Match", cached["etag"])
+
     try:
-        with urllib.request.urlopen(url) as response:
+        with urllib.request.urlopen(request) as response:
             data = json.loads(response.read())
+            etag = response.headers.get("ETag", "")
     except HTTPError as exc:
+        if exc.code == 304:
+            _write_label_cache(cache_file, cached.get("etag", ""), set(cached.get("labels", [])))
+            return set(cached.get("labels", []))
+
         sys.exit(f"Error {exc.code} retrieving {exc.url}.")
 
     labels = {item["name"] for item in data["labels"]}
+    _write_label_cache(cache_file, etag, labels)
 
     return labels
 
 
+# Tokens matching this never need quoting; most command args (flags, image
+# refs, timeouts) hit the fast path and skip shlex.quote entirely.
+_SAFE_TOKEN = re.compile(r"\A[A-Za-z0-9_@%+=:,./-]+\Z").match
+
+
 def display(command: str | t.Sequence[t.Any], no_log_values: t.Sequence[t.Any] | None = None) -> None:
     if isinstance(command, str):
-        quoted = [command]
+        line = command
     else:
-        quoted = [shlex.quote(str(arg)) for arg in command]
-
-    if no_log_values is None:
-        print(" ".join(quoted), flush=True)
-        return
+        line = " ".join(arg if _SAFE_TOKEN(arg := str(item)) else shlex.quote(arg) for item in command)
 
-    sanitized = []
-    redacted = "*" * 8
-    for arg in quoted:
-        for value in no_log_values:
-            if value in arg:
-                sanitized.append(arg.replace(value, redacted))
-                break
-        else:
-            sanitized.append(arg)
+    # One alternation pattern sweeps the line once for all secrets.
+    if no_log_values and (pattern := "|".join(re.escape(str(value)) for value in no_log_values if value)):
+        line = re.sub(pattern, "*" * 8, line)
 
-    print(" ".join(sanitized), flush=True)
+    print(line, flush=True)
 
 
 def main() -> None:
@@ -158,29 +274,33 @@ def main() -> None:
     namespace = args.namespace
     requester = args.requester
 
-    snapshot_str = os.environ.get("SNAPSHOT", "")
+    environ = os.environ
+    snapshot_str = environ.get("SNAPSHOT", "")
     try:
-        snapshot = Snapshot.model_validate_json(snapshot_str)
-    except ValidationError:
+        snapshot = parse_snapshot(snapshot_str)
+    except msgspec.DecodeError:
         sys.exit(f"Missing or invalid SNAPSHOT: {snapshot_str}")
 
-    owner, repo = snapshot.components[0].source.git.url.path.split("/")[1:]
-    pr_number = os.environ.get("PR_NUMBER", "")
-    labels = get_pr_labels(pr_number, owner=owner, repo=repo)
-    app_name = os.environ.get("APP_NAME")
-    components = os.environ.get("COMPONENTS", "").split()
-    components_arg = chain.from_iterable(("--component", component) for component in components)
-    components_with_resources = os.environ.get("COMPONENTS_W_RESOURCES", "").split()
-    components_with_resources_arg = chain.from_iterable(("--no-remove-resources", component) for component in components_with_resources)
+    owner, repo = urllib.parse.urlsplit(snapshot.components[0].source.git.url).path.split("/")[1:]
+    pr_number = environ.get("PR_NUMBER", "")
+    # Overlap the GitHub round-trip with the env parsing below.
+    labels_future = ThreadPoolExecutor(max_workers=1).submit(get_pr_labels, pr_number, owner=owner, repo=repo)
+    app_name = environ.get("APP_NAME")
+    components = environ.get("COMPONENTS", "").split()
+    components_arg = [arg for component in components for arg in ("--component", component)]
+    components_with_resources = environ.get("COMPONENTS_W_RESOURCES", "").split()
+    components_with_resources_arg = [arg for component in components_with_resources for arg in ("--no-remove-resources", component)]
     snapshot_components = set(component.name for component in snapshot.components)
-    deploy_frontends = os.environ.get("DEPLOY_FRONTENDS") or "false"
-    deploy_timeout = get_timeout("DEPLOY_TIMEOUT", labels)
-    extra_deploy_args = os.environ.get("EXTRA_DEPLOY_ARGS", "")
-    optional_deps_method = os.environ.get("OPTIONAL_DEPS_METHOD", "hybrid")
-    ref_env = os.environ.get("REF_ENV", "insights-production")
+    deploy_frontends = environ.get("DEPLOY_FRONTENDS") or "false"
+    extra_deploy_args = environ.get("EXTRA_DEPLOY_ARGS", "")
+    optional_deps_method = environ.get("OPTIONAL_DEPS_METHOD", "hybrid")
+    ref_env = environ.get("REF_ENV", "insights-production")
     cred_params = []
     no_log_values = []
 
+    labels = labels_future.result()
+    deploy_timeout = get_timeout("DEPLOY_TIMEOUT", labels)
+
     if "ok-to-skip-smokes" in labels:
         display("PR labeled to skip smoke tests")
         return
@@ -200,10 +320,10 @@ def main() -> None:
             return
 
         # Credentials
-        aws_credentials_eph = os.environ.get("AWS_CREDENTIALS_EPH")
-        gcp_credentials_eph = os.environ.get("GCP_CREDENTIALS_EPH")
-        oci_credentials_eph = os.environ.get("OCI_CREDENTIALS_EPH")
-        oci_config_eph = os.environ.get("OCI_CONFIG_EPH")
+        aws_credentials_eph = environ.get("AWS_CREDENTIALS_EPH")
+        gcp_credentials_eph = environ.get("GCP_CREDENTIALS_EPH")
+        oci_credentials_eph = environ.get("OCI_CREDENTIALS_EPH")
+        oci_config_eph = environ.get("OCI_CONFIG_EPH")
 
         cred_params = [
             "--set-parameter", f"koku/AWS_CREDENTIALS_EPH={aws_credentials_eph}",
@@ -241,7 +361,8 @@ def main() -> None:
     if args.check:
         sys.exit()
 
-    subprocess.check_call(command, env=os.environ | {"BONFIRE_NS_REQUESTER": requester})
+    os.environ["BONFIRE_NS_REQUESTER"] = requester
+    subprocess.check_call(command)
 
 
 if __name__ == "__main__":
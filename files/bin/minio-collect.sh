@@ -16,14 +16,14 @@ main() {
     oc_wrapper port-forward "svc/env-$ns-minio" "$local_svc_port:9000" -n "$ns" &
     sleep 5
 
-    # Get the secret from the env
-    oc_wrapper get secret "env-$ns-minio" -o json -n "$ns" | jq -r '.data' > minio-creds.json
-
-    # Grab the needed creds from the secret
+    # Grab the needed creds from the secret in a single pass; jq decodes
+    # both fields so no temp file or extra base64 processes are needed
     local minio_access
-    minio_access=$(jq -r .accessKey < minio-creds.json | base64 -d)
     local minio_secret
-    minio_secret=$(jq -r .secretKey < minio-creds.json | base64 -d)
+    {
+        read -r minio_access
+        read -r minio_secret
+    } < <(oc_wrapper get secret "env-$ns-minio" -o json -n "$ns" | jq -r '(.data.accessKey, .data.secretKey) | @base64d')
     local minio_host=localhost
 
     if [[ -z "$minio_access" ]] || [[ -z "$minio_secret" ]] || [[ -z "$local_svc_port" ]]; then
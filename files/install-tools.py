@@ -1,7 +1,7 @@
 #!/usr/bin/env python
 
-import io
 import platform
+import shutil
 import tarfile
 import urllib.parse
 import urllib.request
@@ -14,13 +14,17 @@ from pathlib import Path
 def install_oc(output_dir: Path = Path("/usr/local/bin")) -> str:
     version = "4.16"
     url = f"https://mirror.openshift.com/pub/openshift-v4/clients/ocp/stable-{version}/openshift-client-linux.tar.gz"
-    with urllib.request.urlopen(url) as resp:
-        b_tar_data = io.BytesIO(resp.read())
-
-    members_to_extract = ["oc"]
-    with tarfile.open(fileobj=b_tar_data) as archive:
-        for member in members_to_extract:
-            archive.extract(member, path=str(output_dir))
+    members_to_extract = {"oc"}
+    # Stream the archive straight from the response so the tarball is never
+    # buffered in memory; extraction starts as soon as bytes arrive.
+    with urllib.request.urlopen(url) as resp, tarfile.open(fileobj=resp, mode="r|gz") as archive:
+        remaining = set(members_to_extract)
+        for member in archive:
+            if member.name in remaining:
+                archive.extract(member, path=str(output_dir))
+                remaining.discard(member.name)
+                if not remaining:
+                    break
 
     return f"Installed {', '.join(members_to_extract)} to {output_dir}"
 
@@ -30,8 +34,10 @@ def install_mc(output_dir: Path = Path("/usr/local/bin")) -> str:
     architecture = "arm64" if "arm" in platform.machine() else "amd64"
     url = f"https://dl.min.io/client/mc/release/{system}-{architecture}/mc"
     mc_path = output_dir / "mc"
-    with urllib.request.urlopen(url) as resp:
-        mc_path.write_bytes(resp.read())
+    # Copy the response to disk in chunks rather than holding the whole
+    # binary in memory first.
+    with urllib.request.urlopen(url) as resp, mc_path.open("wb") as f:
+        shutil.copyfileobj(resp, f)
 
     mc_path.chmod(0o0755)
 
@@ -45,15 +45,16 @@ def main() -> None:
 
     print("Freezing requirements")
     freezer_venv = "/opt/venvs/freezer"
-    command = [container_runtime, "exec", container_id, "python", "-m", "venv", freezer_venv]
-    run(command, container_id=container_id)
-
-    command = [
-        container_runtime, "exec", container_id,
-        f"{freezer_venv}/bin/python", "-m", "pip", "install", "--upgrade", "--disable-pip-version-check",
-        "--requirement", "/usr/share/container-setup/requirements/requirements.in",
-        "--constraint", "/usr/share/container-setup/requirements/constraints.txt",
-    ]  # fmt: off
+    # One exec for venv creation and install; each exec pays its own
+    # container attach overhead. The freeze stays separate so its stdout
+    # contains nothing but the frozen requirements.
+    setup_script = (
+        f"python -m venv {freezer_venv}"
+        f" && {freezer_venv}/bin/python -m pip install --upgrade --disable-pip-version-check"
+        " --requirement /usr/share/container-setup/requirements/requirements.in"
+        " --constraint /usr/share/container-setup/requirements/constraints.txt"
+    )
+    command = [container_runtime, "exec", container_id, "bash", "-c", setup_script]
     run(command, container_id=container_id)
 
     command = [